@@ -8,8 +8,15 @@ to interact with a FastMCP server, calling tools, resources, and prompts.
 import asyncio
 import logging
 import sys
+from typing import Dict, Any
 from mcpsock import WebSocketClient
 
+try:
+    import uvloop
+except ImportError:
+    # uvloop is not available on Windows; fall back to the default event loop
+    uvloop = None
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,14 +32,16 @@ async def main():
     # Configure server URL
     server_url = "ws://localhost:8765/ws"
     
-    # Connect to the server
+    # Connect to the server; entering the context completes the initialize
+    # round-trip, and every call below awaits its own response, so no fixed
+    # sleeps are needed to wait for the connection or drain replies
     async with WebSocketClient(server_url) as client:
         try:
             # First, let's discover what's available on the server
-            await discover_capabilities(client)
+            tool_index = await discover_capabilities(client)
             
             # Example of calling tools
-            await call_tool_examples(client)
+            await call_tool_examples(client, tool_index)
             
             # Example of accessing resources
             await access_resource_examples(client)
@@ -40,49 +49,54 @@ async def main():
             # Example of using prompts
             await use_prompt_examples(client)
             
-        except Exception as e:
-            logger.error(f"Error in client example: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error in client example")
+
+async def discover_capabilities(client: WebSocketClient) -> Dict[str, Any]:
+    """Discover available tools, resources, and prompts on the server
 
-async def discover_capabilities(client: WebSocketClient):
-    """Discover available tools, resources, and prompts on the server"""
+    Returns the discovered tools indexed by name.
+    """
     logger.info("Discovering server capabilities...")
     
     # List available tools
     tools = await client.list_tools()
-    logger.info(f"Found {len(tools)} tools:")
+    logger.info("Found %s tools:", len(tools))
     for tool in tools:
-        logger.info(f"  - {tool.name}: {tool.description}")
+        logger.info("  - %s: %s", tool.name, tool.description)
     
     # List available resources
     resources = await client.list_resources()
-    logger.info(f"Found {len(resources)} resources:")
+    logger.info("Found %s resources:", len(resources))
     for resource in resources:
-        logger.info(f"  - {resource.name}: {resource.description}")
+        logger.info("  - %s: %s", resource.name, resource.description)
     
     # List available prompts
     prompts = await client.list_prompts()
-    logger.info(f"Found {len(prompts)} prompts:")
+    logger.info("Found %s prompts:", len(prompts))
     for prompt in prompts:
-        logger.info(f"  - {prompt.name}: {prompt.description}")
+        logger.info("  - %s: %s", prompt.name, prompt.description)
+    
+    return {tool.name: tool for tool in tools}
 
-async def call_tool_examples(client: WebSocketClient):
+async def call_tool_examples(client: WebSocketClient, tool_index: Dict[str, Any]):
     """Examples of calling different tools"""
     logger.info("Running tool examples...")
     
     # Example 1: Query data
-    query_result = await client.call_tool("/tools/data/query_data", {
-        "query": "sales data for Q1 2024"
-    })
-    logger.info(f"Data query result: {query_result}")
+    if "/tools/data/query_data" in tool_index:
+        query_result = await client.call_tool("/tools/data/query_data", {
+            "query": "sales data for Q1 2024"
+        })
+        logger.info("Data query result: %s", query_result)
     
     # Example 2: Send a chat message
-    message_result = await client.call_tool("/tools/chat/send_message", {
-        "message": "Hello from the client example!",
-        "channel": "general"
-    })
-    logger.info(f"Message result: {message_result}")
+    if "/tools/chat/send_message" in tool_index:
+        message_result = await client.call_tool("/tools/chat/send_message", {
+            "message": "Hello from the client example!",
+            "channel": "general"
+        })
+        logger.info("Message result: %s", message_result)
 
 async def access_resource_examples(client: WebSocketClient):
     """Examples of accessing different resources"""
@@ -92,17 +106,17 @@ async def access_resource_examples(client: WebSocketClient):
     json_data = await client.get_resource("/resources/data/sample_dataset", {
         "format": "json"
     })
-    logger.info(f"Sample dataset (JSON): {json_data}")
+    logger.info("Sample dataset (JSON): %s", json_data)
     
     # Example 2: Get sample dataset as CSV
     csv_data = await client.get_resource("/resources/data/sample_dataset", {
         "format": "csv"
     })
-    logger.info(f"Sample dataset (CSV): {csv_data}")
+    logger.info("Sample dataset (CSV): %s", csv_data)
     
     # Example 3: Get list of available models
     models = await client.get_resource("/resources/models/list")
-    logger.info(f"Available models: {models}")
+    logger.info("Available models: %s", models)
 
 async def use_prompt_examples(client: WebSocketClient):
     """Examples of using different prompts"""
@@ -115,7 +129,7 @@ async def use_prompt_examples(client: WebSocketClient):
             "topic": "FastMCP protocol"
         }
     })
-    logger.info(f"Generated text: {generated_text}")
+    logger.info("Generated text: %s", generated_text)
     
     # Example 2: Use chat completion
     chat_result = await client.call_prompt("/prompts/chat/complete", {
@@ -124,8 +138,11 @@ async def use_prompt_examples(client: WebSocketClient):
             {"role": "user", "content": "What are the benefits of using WebSockets for API communication?"}
         ]
     })
-    logger.info(f"Chat completion result: {chat_result}")
+    logger.info("Chat completion result: %s", chat_result)
 
 if __name__ == "__main__":
-    # Run the example
-    asyncio.run(main())
+    # Run the example on the uvloop event loop when it is installed
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
@@ -0,0 +1,469 @@
+"""
+FastMCP WebSocket Gateway
+
+This module extends the mcpsock WebSocketServer with a faster per-frame
+hot path. Messages are decoded and encoded with orjson, and responses are
+sent as binary frames so no intermediate str is built on the way out.
+Binary frames from clients are parsed straight from bytes as well.
+Clients that offer the "msgpack" WebSocket subprotocol, when msgspec is
+installed, exchange MessagePack frames instead of JSON.
+
+Each connection runs inside an asyncio.TaskGroup: every request is handled
+in its own child task, up to MAX_IN_FLIGHT_REQUESTS at a time, and a client
+disconnect cancels whatever is still in flight for that connection.
+Responses are encoded by the task that produced them and handed to a
+bounded per-connection outbox, which a single writer task drains onto the
+socket. When a client stops reading, the outbox fills, the request tasks
+waiting on it hold every in-flight slot, and the reader stops pulling
+frames, so the socket pushes back on the client.
+
+Incoming methods are dispatched with a single lookup in a flat route
+table. The default list_tools, list_resources and list_prompts responses
+are encoded once and reused until a handler of that kind is registered.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import re
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect
+from mcpsock import WebSocketServer
+from mcpsock.server import MessageType
+
+try:
+    import msgspec
+except ImportError:
+    # msgspec is optional; without it only JSON is negotiated
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of encoded frames waiting to be written to one client
+OUTBOX_SIZE = 256
+
+# Maximum number of requests handled at once for one client; once reached,
+# the reader stops pulling frames until one of them finishes
+MAX_IN_FLIGHT_REQUESTS = 256
+
+# Thread pool that runs handlers declared with a plain def
+_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="gateway-handler")
+
+# A run of 19 or more digits may hold an integer outside orjson's 64-bit
+# range, which orjson would silently read as a float
+_LONG_NUMBER = re.compile(r"\d{19}")
+_LONG_NUMBER_BYTES = re.compile(rb"\d{19}")
+
+
+def _encode_fragment(obj: Any) -> Any:
+    """Expand an orjson.Fragment for the stdlib json fallback"""
+    if isinstance(obj, orjson.Fragment):
+        return json.loads(orjson.dumps(obj))
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONCodec:
+    """
+    Encodes and decodes messages as JSON with orjson.
+
+    orjson only handles integers that fit in 64 bits, so payloads holding
+    larger integers fall back to the stdlib json module and keep their exact
+    value.
+    """
+
+    name = "json"
+    label = "JSON"
+
+    @staticmethod
+    def encode(payload: Any) -> bytes:
+        """Encode a payload to bytes"""
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return json.dumps(
+                payload, default=_encode_fragment, ensure_ascii=False, separators=(",", ":")
+            ).encode()
+
+    @staticmethod
+    def decode(data: Union[bytes, str]) -> Any:
+        """Decode a frame payload"""
+        pattern = _LONG_NUMBER_BYTES if isinstance(data, bytes) else _LONG_NUMBER
+        if pattern.search(data):
+            return json.loads(data)
+        return orjson.loads(data)
+
+    @staticmethod
+    def raw(encoded: bytes) -> orjson.Fragment:
+        """Wrap already-encoded bytes so encode() embeds them as-is"""
+        return orjson.Fragment(encoded)
+
+
+class MsgpackCodec:
+    """Encodes and decodes messages as MessagePack with msgspec"""
+
+    name = "msgpack"
+    label = "MessagePack"
+
+    def __init__(self):
+        """Create the reusable msgspec encoder and decoder"""
+        self._encoder = msgspec.msgpack.Encoder()
+        self._decoder = msgspec.msgpack.Decoder()
+
+    def encode(self, payload: Any) -> bytes:
+        """Encode a payload to bytes"""
+        return self._encoder.encode(payload)
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        """Decode a frame payload"""
+        return self._decoder.decode(data)
+
+    @staticmethod
+    def raw(encoded: bytes) -> "msgspec.Raw":
+        """Wrap already-encoded bytes so encode() embeds them as-is"""
+        return msgspec.Raw(encoded)
+
+
+Codec = Union[JSONCodec, MsgpackCodec]
+
+JSON_CODEC = JSONCodec()
+
+# Codecs by WebSocket subprotocol name
+CODECS: Dict[str, Codec] = {JSON_CODEC.name: JSON_CODEC}
+if msgspec is not None:
+    CODECS[MsgpackCodec.name] = MsgpackCodec()
+
+# Error responses that carry no request id, encoded once per codec
+ERROR_FRAMES: Dict[str, Dict[str, bytes]] = {
+    name: {
+        "parse_error": codec.encode({
+            "error": {
+                "code": -32700,
+                "message": f"Invalid {codec.label}"
+            }
+        }),
+        "invalid_request": codec.encode({
+            "error": {
+                "code": -32600,
+                "message": "Invalid Request"
+            }
+        }),
+    }
+    for name, codec in CODECS.items()
+}
+
+
+class WebSocketGateway(WebSocketServer):
+    """
+    A WebSocketServer that serializes messages with orjson, or with msgspec
+    MessagePack when the client negotiates the "msgpack" subprotocol.
+
+    Handlers are registered exactly as with WebSocketServer; only the
+    encoding and decoding of WebSocket frames differs.
+
+    As in FastAPI, handlers declared with ``async def`` run on the event
+    loop, while handlers declared with a plain ``def`` are treated as
+    blocking and run in a thread pool so they cannot stall other clients.
+    """
+
+    def __init__(self):
+        """Initialize the gateway with no open connections"""
+        # Encoded default listings, keyed by "tools", "resources" or "prompts"
+        # and then by codec name
+        self.listing_cache: Dict[str, Dict[str, bytes]] = {}
+        # Flat method -> (handler, type) table, rebuilt on every registration
+        self.routes: Dict[str, Tuple[Callable, MessageType]] = {}
+        super().__init__()
+        # Connections are removed when their handler exits; the WeakSet is a
+        # safety net so a missed removal cannot keep a WebSocket alive
+        self.active_connections: weakref.WeakSet[WebSocket] = weakref.WeakSet()
+        self.codecs: Dict[WebSocket, Codec] = {}
+        self.outboxes: Dict[WebSocket, asyncio.Queue] = {}
+
+    async def handle_websocket(self, websocket: WebSocket) -> None:
+        """Handle a WebSocket connection"""
+        subprotocol, codec = self._negotiate_codec(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        self.codecs[websocket] = codec
+        self.active_connections.add(websocket)
+        logger.info("WebSocket connection accepted")
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                outbox = self.outboxes[websocket] = asyncio.Queue(maxsize=OUTBOX_SIZE)
+                tg.create_task(self._write_frames(outbox, websocket))
+                in_flight = asyncio.Semaphore(MAX_IN_FLIGHT_REQUESTS)
+                async for message in self._iter_frames(websocket):
+                    await in_flight.acquire()
+                    task = tg.create_task(self._process_message(message, websocket))
+                    task.add_done_callback(lambda _: in_flight.release())
+
+        except* WebSocketDisconnect:
+            logger.info("WebSocket disconnected")
+        except* Exception:
+            logger.exception("Error handling WebSocket")
+        finally:
+            self.active_connections.discard(websocket)
+            self.codecs.pop(websocket, None)
+            self.outboxes.pop(websocket, None)
+            logger.info("WebSocket connection removed")
+
+    @staticmethod
+    def _negotiate_codec(websocket: WebSocket) -> Tuple[Optional[str], Codec]:
+        """Pick the first subprotocol offered by the client that has a codec"""
+        for subprotocol in websocket.scope.get("subprotocols", []):
+            codec = CODECS.get(subprotocol)
+            if codec is not None:
+                return subprotocol, codec
+        return None, JSON_CODEC
+
+    @staticmethod
+    async def _iter_frames(websocket: WebSocket) -> AsyncIterator[Union[bytes, str]]:
+        """
+        Yield the payload of each incoming frame until the client disconnects.
+
+        Unlike WebSocket.iter_text and WebSocket.iter_bytes, this accepts both
+        frame types: binary frames are yielded as bytes without being decoded,
+        and text frames are yielded as the str the ASGI server already built.
+        A disconnect raises WebSocketDisconnect so the connection's task group
+        cancels any requests still being handled.
+        """
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+            frame = message.get("bytes")
+            yield frame if frame is not None else message["text"]
+
+    @staticmethod
+    async def _write_frames(outbox: asyncio.Queue, websocket: WebSocket) -> None:
+        """Write encoded frames from the outbox to the client, in order"""
+        while True:
+            await websocket.send_bytes(await outbox.get())
+
+    async def send_payload(self, payload: Any, websocket: WebSocket) -> None:
+        """Encode a payload with the connection's codec and queue it as a binary frame"""
+        codec = self.codecs.get(websocket, JSON_CODEC)
+        await self.send_frame(codec.encode(payload), websocket)
+
+    async def send_error(self, error: str, websocket: WebSocket) -> None:
+        """Queue one of the pre-encoded ERROR_FRAMES in the connection's codec"""
+        codec = self.codecs.get(websocket, JSON_CODEC)
+        await self.send_frame(ERROR_FRAMES[codec.name][error], websocket)
+
+    async def send_frame(self, frame: bytes, websocket: WebSocket) -> None:
+        """
+        Queue an encoded frame to be sent to the client.
+
+        Waits while the connection's outbox is full. Outside of a connection
+        handled by this gateway, the frame is sent directly.
+        """
+        outbox = self.outboxes.get(websocket)
+        if outbox is None:
+            await websocket.send_bytes(frame)
+            return
+        await outbox.put(frame)
+
+    async def dispatch_message(self, message: Dict[str, Any], websocket: WebSocket) -> None:
+        """Dispatch a message to the appropriate handler and send the response"""
+        method = message.get("method", "")
+        msg_id = message.get("id")
+
+        logger.debug("Dispatching message: %s (ID: %s)", method, msg_id)
+
+        try:
+            handler, _ = self.get_handler_for_message(message)
+            if inspect.iscoroutinefunction(handler):
+                result = await handler(message, websocket)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(_EXECUTOR, handler, message, websocket)
+                # Callables that are not coroutine functions may still return an
+                # awaitable (sync wrappers, objects with an async __call__)
+                if inspect.isawaitable(result):
+                    result = await result
+
+            # Only send a response if there was an ID (some messages may be notifications)
+            if msg_id is not None:
+                await self.send_payload({"id": msg_id, "result": result}, websocket)
+
+        except ValueError:
+            logger.warning("Unknown method: %s", method)
+            if msg_id is not None:
+                await self.send_payload({
+                    "id": msg_id,
+                    "error": {
+                        "code": -32601,
+                        "message": f"Method not found: {method}"
+                    }
+                }, websocket)
+
+        except Exception as e:
+            logger.error("Error handling method %s: %s", method, e)
+            if msg_id is not None:
+                await self.send_payload({
+                    "id": msg_id,
+                    "error": {
+                        "code": -32000,
+                        "message": f"Error: {str(e)}"
+                    }
+                }, websocket)
+
+    async def _process_message(self, message, websocket):
+        """Parse a single WebSocket message with the connection's codec and dispatch it"""
+        logger.debug("Received message: %s", message)
+
+        if isinstance(message, (bytes, str)):
+            codec = self.codecs.get(websocket, JSON_CODEC)
+            try:
+                data = codec.decode(message)
+            except (ValueError, TypeError):
+                logger.error("Failed to parse message as %s: %s", codec.label, message)
+                await self.send_error("parse_error", websocket)
+                return
+        else:
+            data = message
+
+        if not isinstance(data, dict):
+            logger.error("Message is not an object: %s", message)
+            await self.send_error("invalid_request", websocket)
+            return
+
+        await self.dispatch_message(data, websocket)
+
+    # Registration
+
+    def register_initialize_handler(self, handler: Callable) -> None:
+        """Register a handler for initialize requests"""
+        super().register_initialize_handler(handler)
+        self._rebuild_routes()
+
+    def register_list_tools_handler(self, handler: Callable) -> None:
+        """Register a handler for list_tools requests"""
+        super().register_list_tools_handler(handler)
+        self._rebuild_routes()
+
+    def register_list_resources_handler(self, handler: Callable) -> None:
+        """Register a handler for list_resources requests"""
+        super().register_list_resources_handler(handler)
+        self._rebuild_routes()
+
+    def register_list_prompts_handler(self, handler: Callable) -> None:
+        """Register a handler for list_prompts requests"""
+        super().register_list_prompts_handler(handler)
+        self._rebuild_routes()
+
+    def register_tool_handler(self, tool_path: str, handler: Callable) -> None:
+        """Register a handler for a specific tool path"""
+        super().register_tool_handler(tool_path, handler)
+        self.listing_cache.pop("tools", None)
+        self._rebuild_routes()
+
+    def register_resource_handler(self, resource_path: str, handler: Callable) -> None:
+        """Register a handler for a specific resource path"""
+        super().register_resource_handler(resource_path, handler)
+        self.listing_cache.pop("resources", None)
+        self._rebuild_routes()
+
+    def register_prompt_handler(self, prompt_path: str, handler: Callable) -> None:
+        """Register a handler for a specific prompt path"""
+        super().register_prompt_handler(prompt_path, handler)
+        self.listing_cache.pop("prompts", None)
+        self._rebuild_routes()
+
+    def register_method_handler(self, method_name: str, handler: Callable) -> None:
+        """Register a handler for a specific method name"""
+        super().register_method_handler(method_name, handler)
+        self._rebuild_routes()
+
+    # Route table
+
+    def _rebuild_routes(self) -> None:
+        """
+        Flatten the registered handlers into a single method -> handler table.
+
+        Entries are added from lowest to highest precedence, so a lookup in
+        the table resolves exactly as mcpsock's chain of checks would.
+        """
+        routes: Dict[str, Tuple[Callable, MessageType]] = {}
+
+        for name, handler in self.method_handlers.items():
+            routes[name] = (handler, MessageType.METHOD_CALL)
+
+        for prefix, handlers, msg_type in (
+            ("/prompts/", self.prompt_handlers, MessageType.PROMPT_CALL),
+            ("/resources/", self.resource_handlers, MessageType.RESOURCE_CALL),
+            ("/tools/", self.tool_handlers, MessageType.TOOL_CALL),
+        ):
+            for path, handler in handlers.items():
+                if path.startswith(prefix):
+                    routes[path] = (handler, msg_type)
+
+        for name, handler, msg_type in (
+            ("list_prompts", self.list_prompts_handler, MessageType.LIST_PROMPTS),
+            ("list_resources", self.list_resources_handler, MessageType.LIST_RESOURCES),
+            ("list_tools", self.list_tools_handler, MessageType.LIST_TOOLS),
+            ("initialize", self.initialize_handler, MessageType.INITIALIZE),
+        ):
+            if handler:
+                routes[name] = (handler, msg_type)
+
+        self.routes = routes
+
+    def get_handler_for_message(self, message: Dict[str, Any]) -> Tuple[Callable, MessageType]:
+        """Get the appropriate handler for a message with a single route table lookup"""
+        method = message.get("method", "")
+
+        route = self.routes.get(method)
+        if route is not None:
+            return route
+
+        if self.fallback_handler:
+            return self.fallback_handler, MessageType.UNKNOWN
+
+        raise ValueError(f"No handler registered for method: {method}")
+
+    # Cached default listings
+
+    async def _cached_listing(
+        self,
+        key: str,
+        build: Callable[[Dict[str, Any], WebSocket], Awaitable[Any]],
+        message: Dict[str, Any],
+        websocket: WebSocket,
+    ) -> Any:
+        """Return a listing pre-encoded for the connection's codec, encoding it on first use"""
+        codec = self.codecs.get(websocket, JSON_CODEC)
+        encoded_by_codec = self.listing_cache.setdefault(key, {})
+        encoded = encoded_by_codec.get(codec.name)
+        if encoded is None:
+            encoded = encoded_by_codec[codec.name] = codec.encode(await build(message, websocket))
+        return codec.raw(encoded)
+
+    async def _default_list_tools_handler(
+        self, message: Dict[str, Any], websocket: WebSocket
+    ) -> Any:
+        """Default handler for list_tools requests, served from the listing cache"""
+        return await self._cached_listing(
+            "tools", super()._default_list_tools_handler, message, websocket
+        )
+
+    async def _default_list_resources_handler(
+        self, message: Dict[str, Any], websocket: WebSocket
+    ) -> Any:
+        """Default handler for list_resources requests, served from the listing cache"""
+        return await self._cached_listing(
+            "resources", super()._default_list_resources_handler, message, websocket
+        )
+
+    async def _default_list_prompts_handler(
+        self, message: Dict[str, Any], websocket: WebSocket
+    ) -> Any:
+        """Default handler for list_prompts requests, served from the listing cache"""
+        return await self._cached_listing(
+            "prompts", super()._default_list_prompts_handler, message, websocket
+        )
@@ -5,12 +5,22 @@ This example demonstrates how to use the DecoratorRouter to create
 a FastMCP server that supports tools, resources, and prompts.
 """
 
+import os
+import re
+import sys
 import uvicorn
 from fastapi import FastAPI, WebSocket
 import logging
-from mcpsock import WebSocketServer
+from gateway import WebSocketGateway
 from typing import Dict, Any
 
+try:
+    from granian import Granian
+    from granian.constants import Interfaces, Loops
+except ImportError:
+    # granian is optional; without it the app is served by uvicorn
+    Granian = None
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
@@ -20,7 +30,10 @@ logger = logging.getLogger(__name__)
 app = FastAPI(title="FastMCP WebSocket Router Example")
 
 # Create router with decorators
-router = WebSocketServer()
+router = WebSocketGateway()
+
+# Matches {{name}} placeholders in prompt templates
+_TEMPLATE_PLACEHOLDER = re.compile(r"\{\{([^{}]+)\}\}")
 
 @router.initialize()
 async def handle_initialize(message: Dict[str, Any], websocket: WebSocket):
@@ -45,7 +58,7 @@ async def query_data(message: Dict[str, Any], websocket: WebSocket):
     """Query data from the system using a specified query string"""
     params = message.get("params", {})
     query = params.get("query", "")
-    logger.info(f"Querying data with: {query}")
+    logger.info("Querying data with: %s", query)
     return {"result": f"Data for query: {query}", "timestamp": "2024-04-24T12:34:56Z"}
 
 @router.tool("/tools/chat/send_message")
@@ -54,65 +67,74 @@ async def send_message(message: Dict[str, Any], websocket: WebSocket):
     params = message.get("params", {})
     msg = params.get("message", "")
     channel = params.get("channel", "")
-    logger.info(f"Sending message to {channel}: {msg}")
+    logger.info("Sending message to %s: %s", channel, msg)
     return {"status": "sent", "channel": channel, "message": msg, "timestamp": "2024-04-24T12:34:56Z"}
 
 #
 # Resource Handlers
 #
 
+# Static resource payloads, built once at import and shared by every request.
+# Handlers return them as-is, so they must never be mutated.
+_SAMPLE_JSON = {
+    "id": "sample-dataset-001",
+    "data": [
+        {"id": 1, "name": "Item 1", "value": 10.5},
+        {"id": 2, "name": "Item 2", "value": 20.8},
+        {"id": 3, "name": "Item 3", "value": 15.2}
+    ],
+    "metadata": {
+        "description": "Sample dataset for testing",
+        "created": "2024-04-24T12:00:00Z"
+    }
+}
+
+_SAMPLE_CSV = "id,name,value\n1,Item 1,10.5\n2,Item 2,20.8\n3,Item 3,15.2"
+
+_MODELS_RESPONSE = {
+    "models": [
+        {
+            "id": "model-base",
+            "name": "Base Model",
+            "description": "General purpose language model"
+        },
+        {
+            "id": "model-code",
+            "name": "Code Model",
+            "description": "Specialized for code generation and understanding"
+        },
+        {
+            "id": "model-science",
+            "name": "Science Model",
+            "description": "Optimized for scientific and technical content"
+        }
+    ]
+}
+
+# Sample dataset payloads by requested format
+_SAMPLE_DATASET_FORMATS = {"json": _SAMPLE_JSON, "csv": _SAMPLE_CSV}
+
 @router.resource("/resources/data/sample_dataset")
 async def get_sample_dataset(message: Dict[str, Any], websocket: WebSocket):
     """Provides access to a sample dataset in various formats"""
     params = message.get("params", {})
     format_type = params.get("format", "json")
     
-    logger.info(f"Getting sample dataset in format: {format_type}")
+    logger.info("Getting sample dataset in format: %s", format_type)
     
     # Here we'd typically fetch data from a database or file
-    # For this example, we'll just return some sample data
-    if format_type == "json":
-        return {
-            "id": "sample-dataset-001",
-            "data": [
-                {"id": 1, "name": "Item 1", "value": 10.5},
-                {"id": 2, "name": "Item 2", "value": 20.8},
-                {"id": 3, "name": "Item 3", "value": 15.2}
-            ],
-            "metadata": {
-                "description": "Sample dataset for testing",
-                "created": "2024-04-24T12:00:00Z"
-            }
-        }
-    elif format_type == "csv":
-        return "id,name,value\n1,Item 1,10.5\n2,Item 2,20.8\n3,Item 3,15.2"
-    else:
+    # For this example, we'll just return the shared sample data
+    dataset = _SAMPLE_DATASET_FORMATS.get(format_type)
+    if dataset is None:
         raise ValueError(f"Unsupported format: {format_type}")
+    return dataset
 
 @router.resource("/resources/models/list")
 async def list_models(message: Dict[str, Any], websocket: WebSocket):
     """Returns a list of available models"""
     logger.info("Listing available models")
     
-    return {
-        "models": [
-            {
-                "id": "model-base",
-                "name": "Base Model",
-                "description": "General purpose language model"
-            },
-            {
-                "id": "model-code",
-                "name": "Code Model",
-                "description": "Specialized for code generation and understanding"
-            },
-            {
-                "id": "model-science",
-                "name": "Science Model",
-                "description": "Optimized for scientific and technical content"
-            }
-        ]
-    }
+    return _MODELS_RESPONSE
 
 #
 # Prompt Handlers
@@ -125,26 +147,31 @@ async def generate_text(message: Dict[str, Any], websocket: WebSocket):
     template = params.get("template", "")
     variables = params.get("variables", {})
     
-    logger.info(f"Generating text with template: {template}")
-    logger.debug(f"Variables: {variables}")
-    
-    # Simple template rendering
-    result = template
-    for key, value in variables.items():
-        placeholder = "{{" + key + "}}"
-        result = result.replace(placeholder, str(value))
+    logger.info("Generating text with template: %s", template)
+    logger.debug("Variables: %s", variables)
     
-    return result
-
+    def render(match: re.Match) -> str:
+        key = match.group(1)
+        if key in variables:
+            return str(variables[key])
+        if key.strip() in variables:
+            return str(variables[key.strip()])
+        return match.group(0)
+
+    # Simple template rendering in a single pass; unknown placeholders are left as-is
+    return _TEMPLATE_PLACEHOLDER.sub(render, template)
+
+# Declared with a plain def: the gateway runs it in a thread pool, which is
+# where a real (blocking) LLM call belongs
 @router.prompt("/prompts/chat/complete")
-async def chat_completion(message: Dict[str, Any], websocket: WebSocket):
+def chat_completion(message: Dict[str, Any], websocket: WebSocket):
     """Simulates a chat completion endpoint"""
     params = message.get("params", {})
     messages = params.get("messages", [])
     system_prompt = params.get("system", "You are a helpful assistant.")
     
-    logger.info(f"Chat completion with {len(messages)} messages")
-    logger.debug(f"System prompt: {system_prompt}")
+    logger.info("Chat completion with %s messages", len(messages))
+    logger.debug("System prompt: %s", system_prompt)
     
     # In a real implementation, this would call an actual LLM
     # For this example, we'll just echo back the last message
@@ -166,4 +193,34 @@ router.attach_to_app(app)
 # Run the app
 if __name__ == "__main__":
     logger.info("Starting FastMCP WebSocket Router Example...")
-    uvicorn.run(app, host="0.0.0.0", port=8765)
+    # One worker per core; each worker process imports this module and gets
+    # its own router and connection set
+    workers = os.cpu_count() or 1
+    if Granian is not None and sys.platform == "linux":
+        # granian does socket I/O in its Rust runtime, off the Python event loop
+        Granian(
+            "server:app",
+            address="0.0.0.0",
+            port=8765,
+            interface=Interfaces.ASGI,
+            workers=workers,
+            loop=Loops.uvloop,
+            backpressure=1000,
+        ).serve()
+    else:
+        uvicorn.run(
+            "server:app",
+            host="0.0.0.0",
+            port=8765,
+            workers=workers,
+            # "auto" picks uvloop and httptools when uvicorn[standard] installed them
+            loop="auto",
+            http="auto",
+            ws="websockets",
+            # Compress frames with permessage-deflate when the client offers it,
+            # and reject any single message larger than 1 MiB
+            ws_per_message_deflate=True,
+            ws_max_size=1024 * 1024,
+            limit_concurrency=1000,
+            timeout_keep_alive=30,
+        )
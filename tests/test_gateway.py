@@ -0,0 +1,247 @@
+"""Tests for the WebSocketGateway in gateway.py"""
+
+import asyncio
+import functools
+import threading
+
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mcpsock.server import MessageType
+
+from gateway import WebSocketGateway
+
+
+@pytest.fixture
+def router():
+    return WebSocketGateway()
+
+
+@pytest.fixture
+def client(router):
+    app = FastAPI()
+    router.attach_to_app(app)
+    return TestClient(app)
+
+
+def request(ws, message):
+    ws.send_bytes(orjson.dumps(message))
+    return orjson.loads(ws.receive_bytes())
+
+
+def test_parse_error(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text("not json")
+        assert orjson.loads(ws.receive_bytes()) == {
+            "error": {"code": -32700, "message": "Invalid JSON"}
+        }
+
+
+def test_invalid_request(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text("[1, 2]")
+        assert orjson.loads(ws.receive_bytes()) == {
+            "error": {"code": -32600, "message": "Invalid Request"}
+        }
+
+        # The connection stays usable after an invalid request
+        response = request(ws, {"id": 1, "method": "initialize"})
+        assert response["id"] == 1
+        assert "protocolVersion" in response["result"]
+
+
+def test_closed_connection_is_not_counted(router, client):
+    with client.websocket_connect("/ws") as ws:
+        request(ws, {"id": 1, "method": "initialize"})
+        assert len(router.active_connections) == 1
+
+    assert len(router.active_connections) == 0
+
+
+def test_plain_def_handler_runs_in_thread_pool(router, client):
+    @router.method("thread")
+    def thread_name(message, websocket):
+        return threading.current_thread().name
+
+    with client.websocket_connect("/ws") as ws:
+        result = request(ws, {"id": 1, "method": "thread"})["result"]
+        assert result.startswith("gateway-handler")
+
+
+def test_handlers_returning_awaitables(router, client):
+    async def greet(message, websocket):
+        return "hello"
+
+    @functools.wraps(greet)
+    def wrapped(message, websocket):
+        return greet(message, websocket)
+
+    class Greeter:
+        async def __call__(self, message, websocket):
+            return "hello"
+
+    router.register_method_handler("wrapped", wrapped)
+    router.register_method_handler("callable", Greeter())
+
+    with client.websocket_connect("/ws") as ws:
+        assert request(ws, {"id": 1, "method": "wrapped"}) == {"id": 1, "result": "hello"}
+        assert request(ws, {"id": 2, "method": "callable"}) == {"id": 2, "result": "hello"}
+
+
+def test_non_str_keys_are_encoded_like_stdlib(router, client):
+    @router.method("counts")
+    async def counts(message, websocket):
+        return {1: 10, 2: 20}
+
+    with client.websocket_connect("/ws") as ws:
+        ws.send_bytes(orjson.dumps({"id": 1, "method": "counts"}))
+        assert ws.receive_bytes() == b'{"id":1,"result":{"1":10,"2":20}}'
+
+
+def test_integers_beyond_64_bits_keep_their_value(router, client):
+    big = 123456789012345678901234567890
+
+    @router.method("echo")
+    async def echo(message, websocket):
+        return {"value": message["params"]["value"], "double": message["params"]["value"] * 2}
+
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text(f'{{"id":{big},"method":"echo","params":{{"value":{big}}}}}')
+        assert ws.receive_bytes() == (
+            f'{{"id":{big},"result":{{"value":{big},"double":{big * 2}}}}}'.encode()
+        )
+
+        # A cached listing is still embedded when the id forces the fallback
+        ws.send_text(f'{{"id":{big},"method":"list_tools"}}')
+        assert ws.receive_bytes() == f'{{"id":{big},"result":[]}}'.encode()
+
+
+def test_route_precedence(router):
+    async def tool(message, websocket):
+        return "tool"
+
+    async def method(message, websocket):
+        return "method"
+
+    async def initialize(message, websocket):
+        return "initialize"
+
+    router.register_method_handler("/tools/shared", method)
+    router.register_tool_handler("/tools/shared", tool)
+    router.register_method_handler("initialize", method)
+    router.register_initialize_handler(initialize)
+    # Tools outside the /tools/ prefix are not routed as tools, as in mcpsock
+    router.register_tool_handler("unprefixed", tool)
+
+    assert router.get_handler_for_message({"method": "/tools/shared"}) == (
+        tool, MessageType.TOOL_CALL
+    )
+    assert router.get_handler_for_message({"method": "initialize"}) == (
+        initialize, MessageType.INITIALIZE
+    )
+    with pytest.raises(ValueError):
+        router.get_handler_for_message({"method": "unprefixed"})
+
+
+def test_listing_cache_invalidation(router, client):
+    @router.tool("/tools/first")
+    async def first(message, websocket):
+        """First tool"""
+
+    with client.websocket_connect("/ws") as ws:
+        names = [tool["name"] for tool in request(ws, {"id": 1, "method": "list_tools"})["result"]]
+        assert names == ["/tools/first"]
+        assert "json" in router.listing_cache["tools"]
+
+        @router.tool("/tools/second")
+        async def second(message, websocket):
+            """Second tool"""
+
+        assert "tools" not in router.listing_cache
+        names = [tool["name"] for tool in request(ws, {"id": 2, "method": "list_tools"})["result"]]
+        assert names == ["/tools/first", "/tools/second"]
+
+
+def test_msgpack_negotiation(client):
+    msgspec = pytest.importorskip("msgspec")
+    encoder = msgspec.msgpack.Encoder()
+    decoder = msgspec.msgpack.Decoder()
+
+    with client.websocket_connect("/ws", subprotocols=["msgpack", "json"]) as ws:
+        assert ws.accepted_subprotocol == "msgpack"
+        ws.send_bytes(encoder.encode({"id": 1, "method": "list_tools"}))
+        assert decoder.decode(ws.receive_bytes()) == {"id": 1, "result": []}
+
+        ws.send_text("not msgpack")
+        assert decoder.decode(ws.receive_bytes()) == {
+            "error": {"code": -32700, "message": "Invalid MessagePack"}
+        }
+
+
+def test_json_is_default(client):
+    with client.websocket_connect("/ws") as ws:
+        assert ws.accepted_subprotocol is None
+        assert request(ws, {"id": 1, "method": "list_tools"}) == {"id": 1, "result": []}
+
+
+def test_disconnect_cancels_in_flight_requests(router, client):
+    started = threading.Event()
+    cancelled = threading.Event()
+
+    @router.tool("/tools/slow")
+    async def slow(message, websocket):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with client.websocket_connect("/ws") as ws:
+        ws.send_bytes(orjson.dumps({"id": 1, "method": "/tools/slow"}))
+        assert started.wait(5)
+
+    assert cancelled.wait(5)
+
+
+class StalledWebSocket:
+    """A fake WebSocket that always has a frame to read but never finishes a send"""
+
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.frames_read = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def receive(self):
+        self.frames_read += 1
+        await asyncio.sleep(0)
+        return {"type": "websocket.receive", "bytes": b'{"id": 1, "method": "initialize"}'}
+
+    async def send_bytes(self, data):
+        await asyncio.Event().wait()
+
+
+def test_stalled_client_stops_the_reader(router):
+    from gateway import MAX_IN_FLIGHT_REQUESTS, OUTBOX_SIZE
+
+    async def run():
+        websocket = StalledWebSocket()
+        handler = asyncio.create_task(router.handle_websocket(websocket))
+        await asyncio.sleep(0.3)
+        frames_read = websocket.frames_read
+        live_tasks = len(asyncio.all_tasks())
+        handler.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await handler
+        return frames_read, live_tasks
+
+    frames_read, live_tasks = asyncio.run(run())
+
+    # Frames in the outbox, one held by the writer, one per in-flight slot,
+    # and the one frame the reader holds while waiting for a slot
+    limit = OUTBOX_SIZE + 1 + MAX_IN_FLIGHT_REQUESTS + 1
+    assert frames_read <= limit
+    assert live_tasks <= MAX_IN_FLIGHT_REQUESTS + 3
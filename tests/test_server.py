@@ -0,0 +1,21 @@
+"""Tests for the example handlers in server.py"""
+
+import asyncio
+
+import pytest
+
+from server import generate_text
+
+
+@pytest.mark.parametrize(
+    "template, variables, expected",
+    [
+        ("Write about {{topic}}.", {"topic": "MCP"}, "Write about MCP."),
+        ("Hi {{first name}}", {"first name": "Ann"}, "Hi Ann"),
+        ("Hi {{ name }}", {"name": "Ann"}, "Hi Ann"),
+        ("{{a}} and {{missing}}", {"a": 1}, "1 and {{missing}}"),
+    ],
+)
+def test_generate_text(template, variables, expected):
+    message = {"params": {"template": template, "variables": variables}}
+    assert asyncio.run(generate_text(message, None)) == expected